@@ -1,16 +1,51 @@
 import os
+import copy
 import json
 import csv
+import calendar
+import mmap
 import datetime
 import time
 import re
+import heapq
+import functools
+import string
+import email.utils
+from html.parser import HTMLParser
+from types import SimpleNamespace
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from dateutil import tz
 from dateutil import parser as dateparser
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import feedparser
 import yaml
 
+try:
+    from yaml import CSafeLoader
+except ImportError:  # libyaml 無しでビルドされた PyYAML
+    from yaml import SafeLoader as CSafeLoader
+
+try:
+    from lxml import etree
+    from lxml import html as lxml_html
+except ImportError:  # lxml 無しの環境では常に feedparser で解析する
+    etree = None
+    lxml_html = None
+
+try:
+    import ahocorasick
+except ImportError:  # pyahocorasick 無しの環境では正規表現1本で走査する
+    ahocorasick = None
+
+try:
+    import orjson
+except ImportError:  # orjson 無しの環境では標準の json を使う
+    orjson = None
+
 ROOT = Path(__file__).resolve().parents[2]
 NEWS_DIR = ROOT / "news_hub"
 CONFIG_DIR = NEWS_DIR / "config"
@@ -20,59 +55,328 @@ TEMPLATE_DIR = NEWS_DIR / "templates"
 
 JST = tz.gettz("Asia/Tokyo")
 
+EDINET_DOC_URL = "https://disclosure.edinet-fsa.go.jp/api/v2/documents/{}?type=2"
+
+# 同一ホストへの接続を使い回す（並列取得時のTLSハンドシェイクを削減）
+SESSION = requests.Session()
+SESSION.headers.update({"User-Agent": "newshub/1.0", "Accept-Encoding": "gzip, deflate"})
+# 一時的なゲートウェイエラーも再試行する。最終レスポンスは raise_for_status で判定させる。
+# Retry-After は上限無しで sleep されビルド全体が止まり得るので従わない（待ちは backoff のみ）
+_RETRY = Retry(
+    total=2, backoff_factor=0.3, status_forcelist=[502, 503, 504],
+    raise_on_status=False, respect_retry_after_header=False,
+)
+_ADAPTER = HTTPAdapter(pool_connections=32, pool_maxsize=32, max_retries=_RETRY)
+SESSION.mount("https://", _ADAPTER)
+SESSION.mount("http://", _ADAPTER)
+
+# path -> (mtime, size, parsed)。ファイルが変わっていなければ再パースしない
+_YAML_CACHE = OrderedDict()
+_YAML_CACHE_MAX = 100
+
 def load_yaml(p: Path):
+    key = str(p)
+    stat = os.stat(p)
+    hit = _YAML_CACHE.get(key)
+    if hit and hit[0] == stat.st_mtime and hit[1] == stat.st_size:
+        _YAML_CACHE.move_to_end(key)
+        return copy.deepcopy(hit[2])
+
     with p.open("r", encoding="utf-8") as f:
-        return yaml.safe_load(f)
+        data = yaml.load(f, Loader=CSafeLoader)
+    _YAML_CACHE[key] = (stat.st_mtime, stat.st_size, data)
+    if len(_YAML_CACHE) > _YAML_CACHE_MAX:
+        _YAML_CACHE.popitem(last=False)
+    return copy.deepcopy(data)
 
 def now_jst():
     return datetime.datetime.now(tz=JST)
 
+_NL_TABLE = str.maketrans({"\n": " ", "\r": " ", "\t": " "})
+
 def safe_text(x):
-    return (x or "").replace("\n", " ").strip()
+    return (x or "").translate(_NL_TABLE).strip()
+
+_HTML_ESC = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;", "\"": "&quot;", "'": "&#39;"})
+
+def escape_html(x):
+    """HTML埋め込み用のエスケープ（属性値にも使える）"""
+    return str(x if x is not None else "").translate(_HTML_ESC)
+
+_DC_NS = {"dc": "http://purl.org/dc/elements/1.1/"}
+
+if etree is not None:
+    _RSS_PARSER = etree.XMLParser(resolve_entities=False, no_network=True)
+    _RSS_XPATHS = {
+        k: etree.XPath(x, namespaces=_DC_NS)
+        for k, x in {
+            "title": "string(title)",
+            "link": "string(link)",
+            # <link> が無い item は feedparser と同じく permalink の <guid> を使う
+            "guid": "string(guid[not(@isPermaLink) or @isPermaLink='true'])",
+            "summary": "string(description)",
+            "published": "string(pubDate)",
+            "date": "string(dc:date)",
+        }.items()
+    }
+
+def _rss_struct_time(s: str):
+    """pubDate（RFC 822）を feedparser の published_parsed と同じ UTC struct_time にする。
+
+    タイムゾーンの無い日時は None（parse_timestamp_fallback で JST として扱わせる）。
+    """
+    if not s:
+        return None
+    try:
+        dt = email.utils.parsedate_to_datetime(s)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is None:
+        return None
+    try:
+        return time.gmtime(int(dt.timestamp()))
+    except (OverflowError, ValueError, OSError):
+        return None
+
+def parse_rss_lxml(content: bytes):
+    """素の RSS 2.0 を lxml で解析し、feedparser の結果と同じ形（.entries）で返す。
+
+    RSS 2.0 以外（Atom / RDF）や解析できない文書は None を返す（呼び出し側で feedparser に任せる）。
+    """
+    if etree is None:
+        return None
+    try:
+        root = etree.fromstring(content, _RSS_PARSER)
+    except (etree.XMLSyntaxError, ValueError):
+        return None
+    if root.tag != "rss":
+        return None
+
+    entries = []
+    for item in root.iterfind("channel/item"):
+        e = {k: str(x(item)).strip() for k, x in _RSS_XPATHS.items()}
+        published = e.pop("published")
+        date = e.pop("date")
+        guid = e.pop("guid")
+        if not e["link"]:
+            e["link"] = guid
+        entries.append(SimpleNamespace(
+            published=published or date,
+            published_parsed=_rss_struct_time(published),
+            **e,
+        ))
+    return SimpleNamespace(entries=entries)
+
+_SKIP_TEXT_TAGS = ("script", "style")
+
+class _TextExtractor(HTMLParser):
+    """lxml が無いとき用：script/style の中身を除いた本文テキストを集める"""
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self._skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIP_TEXT_TAGS:
+            self._skip += 1
+
+    def handle_endtag(self, tag):
+        if tag in _SKIP_TEXT_TAGS and self._skip:
+            self._skip -= 1
+
+    def handle_data(self, data):
+        if not self._skip:
+            self.parts.append(data)
+
+def html_to_text(s: str) -> str:
+    """RSS の summary（HTML 断片）をプレーンテキストにする。script/style は中身ごと落とす。
+
+    feedparser / lxml どちらで解析したフィードでも同じ結果になるよう、収集時に通す。
+    """
+    if not s or ("<" not in s and "&" not in s):
+        return s or ""
+    text = None
+    if lxml_html is not None:
+        try:
+            frag = lxml_html.fragment_fromstring(s, create_parent=True)
+            for el in list(frag.iter(*_SKIP_TEXT_TAGS)):
+                el.drop_tree()
+            text = frag.text_content()
+        except Exception:
+            text = None
+    if text is None:
+        parser = _TextExtractor()
+        parser.feed(s)
+        parser.close()
+        text = "".join(parser.parts)
+    return _WS_RE.sub(" ", text).strip()
 
 def fetch_rss(url: str, timeout=20):
-    r = requests.get(url, timeout=timeout)
+    r = SESSION.get(url, timeout=timeout)
     r.raise_for_status()
-    return feedparser.parse(r.text)
+    feed = parse_rss_lxml(r.content)
+    if feed is not None:
+        return feed
+    # bytes のまま渡して文字コード判定は feedparser に任せる（HTTPヘッダのcharsetも参照させる）
+    headers = {k.lower(): v for k, v in r.headers.items()}
+    return feedparser.parse(r.content, response_headers=headers)
 
 def fetch_edinet_daily(endpoint: str, api_key: str, date_str: str):
     params = {"date": date_str, "type": 2, "Subscription-Key": api_key}
-    r = requests.get(endpoint, params=params, timeout=30)
+    r = SESSION.get(endpoint, params=params, timeout=30)
     r.raise_for_status()
+    if orjson is not None:
+        return orjson.loads(r.content)
     return r.json()
 
-def tag_from_keywords(title: str, summary: str, tag_keywords: dict):
-    text = (title + " " + summary)
-    tags = []
-    for tag, kws in (tag_keywords or {}).items():
-        for kw in kws:
-            if kw in text:
-                tags.append(tag)
-                break
-    return tags
+def fetch_source(src: dict, api_key: str, date_str: str):
+    """ソース種別に応じて取得する（RSS: feed / EDINET: json）"""
+    if src["type"] == "rss":
+        return fetch_rss(src["url"])
+    if src["type"] == "edinet":
+        return fetch_edinet_daily(src["endpoint"], api_key, date_str)
+    raise ValueError(f"Unknown source type: {src['type']}")
+
+def fetch_sources(sources, api_key: str, date_str: str):
+    """RSS / EDINET のHTTP取得をまとめてスレッドプールで並列実行する。
+
+    戻り値は id(src) -> 取得結果 のdict。取得に失敗したソースは例外オブジェクトを値に持つ。
+    """
+    if not sources:
+        return {}
+
+    def _fetch(src):
+        try:
+            return src, fetch_source(src, api_key, date_str)
+        except Exception as e:
+            return src, e
+
+    with ThreadPoolExecutor(max_workers=min(32, len(sources))) as ex:
+        return {id(src): res for src, res in ex.map(_fetch, sources)}
+
+# allow/deny キーワードのラベル（タグ名は文字列なので衝突しない）
+_ALLOW = ("rule", "allow")
+_DENY = ("rule", "deny")
+
+def compile_keyword_matcher(groups: dict):
+    """{ラベル: [キーワード, ...]} から、本文1回の走査で全ラベルを判定できる matcher を作る。
+
+    キーワードは小文字化して登録する（英字は大文字小文字を区別しない）。
+
+    pyahocorasick があれば Aho-Corasick オートマトン、無ければ正規表現1本で走査する。
+    戻り値は text -> ヒットしたキーワードのラベル集合の iterable を返す関数。キーワードが無ければ None。
+    """
+    kw_to_labels = {}
+    for label, kws in (groups or {}).items():
+        for kw in kws or []:
+            if kw:
+                kw_to_labels.setdefault(kw.lower(), set()).add(label)
+    if not kw_to_labels:
+        return None
+
+    if ahocorasick is not None:
+        # 重なり合う出現もすべて列挙されるので、ラベルはキーワードごとのままでよい
+        automaton = ahocorasick.Automaton()
+        for kw, labels in kw_to_labels.items():
+            automaton.add_word(kw, frozenset(labels))
+        automaton.make_automaton()
+        return lambda text: (labels for _, labels in automaton.iter(text))
+
+    # 先読みで各位置の最長一致を拾う。短いキーワードは長いものの部分文字列として
+    # 隠れることがあるので、含まれるキーワードのラベルも持たせて `kw in text` と同じ結果にする
+    expanded = {
+        kw: set().union(*(labels for k, labels in kw_to_labels.items() if k in kw))
+        for kw in kw_to_labels
+    }
+    alt = "|".join(re.escape(kw) for kw in sorted(kw_to_labels, key=len, reverse=True))
+    pat = re.compile(f"(?=({alt}))")
+    return lambda text: (expanded[kw] for kw in pat.findall(text))
+
+def match_keywords(matcher, text: str) -> set:
+    """matcher に登録したキーワードのうち text に含まれるもののラベル集合（大文字小文字は区別しない）"""
+    hits = set()
+    if matcher:
+        for labels in matcher(text.lower()):
+            hits |= labels
+    return hits
+
+# feedparser と email.utils の両方が正しいオフセットで読める RFC 822 のゾーン名
+_RFC822_ZONES = frozenset({
+    "UT", "UTC", "GMT", "Z",
+    "AST", "ADT", "EST", "EDT", "CST", "CDT", "MST", "MDT", "PST", "PDT",
+})
+_TRAILING_ZONE_NAME_RE = re.compile(r"\s([A-Za-z]+)\s*$")
+
+def _has_unknown_zone_name(s: str) -> bool:
+    """末尾が上記以外のゾーン名（'JST' 等）か。feedparser はこれを +0000 として読んでしまう"""
+    m = _TRAILING_ZONE_NAME_RE.search(s or "")
+    return bool(m) and m.group(1).upper() not in _RFC822_ZONES
 
 def entry_timestamp(e) -> int:
-    """feedparser entry から日時を数値化（新しい順ソート用）"""
-    t = getattr(e, "published_parsed", None) or getattr(e, "updated_parsed", None)
-    if t:
+    """feedparser entry から日時を数値化（新しい順ソート用）。*_parsed は UTC の struct_time。
+
+    未知のゾーン名付きの日時は 0 を返し、parse_timestamp_fallback（JST は +0900）に任せる。
+    lxml 経路は同じ日時で published_parsed が None になるので、どちらのパーサでも同じ値になる。
+    """
+    if getattr(e, "published_parsed", None):
+        t, s = e.published_parsed, getattr(e, "published", "")
+    else:
+        t, s = getattr(e, "updated_parsed", None), getattr(e, "updated", "")
+    if t and not _has_unknown_zone_name(s):
         try:
-            return int(time.mktime(t))
+            return calendar.timegm(t)
         except Exception:
             pass
     return 0
 
+# 国内フィードが使う 'JST' を dateutil に明示する（未知扱いの警告も出さない）
+_DATEUTIL_TZINFOS = {"JST": JST}
+
+@functools.lru_cache(maxsize=4096)
+def _datetime_str_timestamp(s: str) -> int:
+    """日時文字列を timestamp にする。ISO 8601 → RFC 2822（RSS pubDate）→ dateutil の順に試す。
+
+    タイムゾーンが無い場合は JST とみなす。解析できなければ 0。
+    """
+    try:
+        dt = datetime.datetime.fromisoformat(s[:-1] + "+00:00" if s.endswith("Z") else s)
+    except ValueError:
+        try:
+            dt = email.utils.parsedate_to_datetime(s)
+        except (TypeError, ValueError):
+            dt = None
+        # email.utils はゾーン無しも '-0000'（UTC）も naive で返すので、その場合は dateutil に任せる
+        if dt is None or dt.tzinfo is None:
+            try:
+                # dateutil は小文字のゾーン名（'jst' 等）を受け付けないので大文字に揃える
+                dt = dateparser.parse(
+                    _TRAILING_ZONE_NAME_RE.sub(lambda m: " " + m.group(1).upper(), s),
+                    tzinfos=_DATEUTIL_TZINFOS,
+                )
+            except Exception:
+                return 0
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=JST)
+    try:
+        return int(dt.timestamp())
+    except (OverflowError, ValueError, OSError):
+        return 0
+
+# '11/09 17:49' のような年無しの 月/日 時:分
+_MD_HM_RE = re.compile(r"(?P<m>\d{1,2})/(?P<d>\d{1,2})\s+(?P<h>\d{1,2}):(?P<mi>\d{2})")
+
 def parse_timestamp_fallback(published_str: str, now_dt: datetime.datetime) -> int:
     """published_at の文字列から timestamp を推定（RSSがparsed日時を持たない場合の救済）。
 
     主に以下のパターンに対応：
     - '11/09 17:49'（年が無い） -> 現在年を基本に、未来日付になる場合は前年に補正
-    - ISO/一般パース可能な文字列 -> dateutilでパース
+    - ISO / RFC 2822 / 一般パース可能な文字列 -> _datetime_str_timestamp
     """
     s = (published_str or "").strip()
     if not s:
         return 0
 
-    m = re.search(r"(?P<m>\d{1,2})/(?P<d>\d{1,2})\s+(?P<h>\d{1,2}):(?P<mi>\d{2})", s)
+    m = _MD_HM_RE.search(s)
     if m:
         mon = int(m.group('m'))
         day = int(m.group('d'))
@@ -85,59 +389,139 @@ def parse_timestamp_fallback(published_str: str, now_dt: datetime.datetime) -> i
             dt = datetime.datetime(year - 1, mon, day, hh, mi, tzinfo=JST)
         return int(dt.timestamp())
 
-    try:
-        dt = dateparser.parse(s)
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=JST)
-        return int(dt.timestamp())
-    except Exception:
-        return 0
+    return _datetime_str_timestamp(s)
 
 def iso_timestamp(s: str) -> int:
     """EDINET submitDateTime (ISO風) を数値化"""
     if not s:
         return 0
-    try:
-        dt = dateparser.parse(s)
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=JST)
-        return int(dt.timestamp())
-    except Exception:
-        return 0
-
-def render(template_name: str, ctx: dict):
-    tpl = (TEMPLATE_DIR / template_name).read_text(encoding="utf-8")
-    for k, v in ctx.items():
-        tpl = tpl.replace("{{ " + k + " }}", str(v))
+    return _datetime_str_timestamp(s)
+
+_TPL_CACHE = {}
+_TPL_VAR_RE = re.compile(r"\{\{\s*(\w+)\s*\}\}")
+
+def _compile_template(text: str) -> string.Template:
+    """{{ k }} を ${k} に変換した string.Template を作る（本文中の $ はエスケープ）"""
+    return string.Template(_TPL_VAR_RE.sub(r"${\1}", text.replace("$", "$$")))
+
+def load_page_template(template_name: str) -> string.Template:
+    """base.html の {{ content }} にページテンプレートを埋め込んだ1枚のテンプレートをキャッシュして返す"""
+    tpl = _TPL_CACHE.get(template_name)
+    if tpl is None:
+        base = (TEMPLATE_DIR / "base.html").read_text(encoding="utf-8")
+        inner = (TEMPLATE_DIR / template_name).read_text(encoding="utf-8")
+        tpl = _TPL_CACHE[template_name] = _compile_template(base.replace("{{ content }}", inner))
     return tpl
 
-def wrap_base(title: str, subtitle: str, content_html: str, generated_at: str):
-    base = (TEMPLATE_DIR / "base.html").read_text(encoding="utf-8")
-    base = base.replace("{{ title }}", title)
-    base = base.replace("{{ subtitle }}", subtitle)
-    base = base.replace("{{ content }}", content_html)
-    base = base.replace("{{ generated_at }}", generated_at)
-    return base
-
-def build_card(it: dict) -> str:
-    tags = ", ".join(it.get("tags", []))
-    llm_badge = "<span class='badge'>draft</span>" if it.get("llm_draft") else ""
+class _RenderContext(dict):
+    """テンプレートに無いキーは空文字として描画する"""
+    def __missing__(self, key):
+        return ""
+
+def render_page(template_name: str, title: str, subtitle: str, generated_at: str, ctx: dict) -> str:
+    """base + ページテンプレートを1回の置換で描画する（ctx に無い {{ key }} は空文字）"""
+    values = _RenderContext(ctx, title=title, subtitle=subtitle, generated_at=generated_at)
+    return load_page_template(template_name).substitute(values)
+
+def _csv_field(x) -> str:
+    """csv.writer（QUOTE_MINIMAL）と同じ規則で1フィールドを整形する"""
+    v = str(x)
+    if "," in v or '"' in v or "\n" in v or "\r" in v:
+        return '"' + v.replace('"', '""') + '"'
+    return v
+
+def csv_line(fields) -> str:
+    """news_log.csv 追記用の1行（csv.writer と同じく CRLF 終端）"""
+    return ",".join(_csv_field(x) for x in fields) + "\r\n"
+
+# news_log.csv 各行の先頭フィールド（id）。クォートされた id にも対応
+_LOG_ID_RE = re.compile(rb'^(?:"((?:[^"]|"")*)"|([^,\r\n]*)),', re.M)
+_LOG_MMAP_THRESHOLD = 1_000_000
+
+def load_log_ids(log_path: Path) -> set:
+    """news_log.csv の既存 id 集合。大きいログは mmap + 正規表現で1回走査する"""
+    if not log_path.exists():
+        return set()
+
+    if log_path.stat().st_size <= _LOG_MMAP_THRESHOLD:
+        with log_path.open("r", encoding="utf-8", newline="") as f:
+            reader = csv.reader(f)
+            next(reader, None)  # ヘッダ
+            return {row[0] for row in reader if row}
+
+    ids = set()
+    with log_path.open("rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        matches = _LOG_ID_RE.finditer(mm)
+        next(matches, None)  # ヘッダ
+        for m in matches:
+            quoted, plain = m.groups()
+            ids.add(quoted.replace(b'""', b'"').decode("utf-8") if quoted is not None else plain.decode("utf-8"))
+    return ids
+
+_HTML_FIELDS = ("topic_pack", "source", "published_at", "url", "title", "summary_short")
+
+def html_fields(it: dict, cache: dict) -> dict:
+    """表示用にエスケープしたフィールド。cache（id(item) -> dict）に持ってアイテムごとに1回だけ計算する。
+
+    アイテム本体は CSV ログ・ソート・要約にも使うので、生の値のまま何も書き足さない。
+    """
+    esc = cache.get(id(it))
+    if esc is None:
+        esc = cache[id(it)] = {k: escape_html(it[k]) for k in _HTML_FIELDS}
+        esc["tags"] = escape_html(", ".join(it["tags"]))
+    return esc
+
+def build_card(it: dict, esc: dict) -> str:
+    source = esc["source"]
+    published = esc["published_at"]
+    url = esc["url"]
+    title = esc["title"]
+    summary = esc["summary_short"]
+    tags = esc["tags"]
+    llm_badge = "<span class='badge'>draft</span>" if it["llm_draft"] else ""
     return (
-        "<div class='card'>"
-        "<div class='meta'>"
-        f"<span class='badge imp'>重要度 {it.get('importance', 3)}</span>"
-        f"<span class='badge'>{safe_text(it.get('source'))}</span>"
-        f"<span class='badge'>{safe_text(it.get('published_at'))}</span>"
-        f"{llm_badge}"
-        "</div>"
-        f"<div class='title'><a class='link' href='{it.get('url')}' target='_blank' rel='noopener'>{safe_text(it.get('title'))}</a></div>"
-        f"<div class='summary'>{safe_text(it.get('summary_short'))}</div>"
-        f"<div class='meta'><span class='badge'>{safe_text(tags)}</span></div>"
-        "</div>"
+        f"<div class='card'><div class='meta'><span class='badge imp'>重要度 {it['importance']}</span>"
+        f"<span class='badge'>{source}</span><span class='badge'>{published}</span>{llm_badge}</div>"
+        f"<div class='title'><a class='link' href='{url}' target='_blank' rel='noopener'>{title}</a></div>"
+        f"<div class='summary'>{summary}</div><div class='meta'><span class='badge'>{tags}</span></div></div>"
     )
 
-def build_cards(items):
-    return "\n".join(build_card(it) for it in items)
+def build_cards(items, esc_cache: dict):
+    return "\n".join([build_card(it, html_fields(it, esc_cache)) for it in items])
+
+def write_pages(pages):
+    """(path, html) の組をスレッドプールで並列に UTF-8 エンコード＆書き出しする"""
+    if not pages:
+        return
+
+    def _write(page):
+        path, html = page
+        path.write_bytes(html.encode("utf-8"))
+
+    with ThreadPoolExecutor(max_workers=min(4, len(pages))) as ex:
+        list(ex.map(_write, pages))
+
+def load_json(path: Path):
+    """JSON ファイルを読む（orjson があれば bytes のまま解析）"""
+    if orjson is not None:
+        return orjson.loads(path.read_bytes())
+    return json.loads(path.read_text(encoding="utf-8"))
+
+def dump_json(obj) -> bytes:
+    """インデント2・非ASCIIそのままの JSON（UTF-8 bytes）"""
+    if orjson is not None:
+        # 非文字列キーは json.dumps と同様に文字列化する
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, ensure_ascii=False, indent=2).encode("utf-8")
+
+def write_if_changed(path: Path, blob: bytes) -> bool:
+    """内容が変わったときだけ一時ファイル経由の rename で置き換える。書いたら True"""
+    if path.exists() and path.read_bytes() == blob:
+        return False
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_bytes(blob)
+    os.replace(tmp, path)
+    return True
 
 def dedupe_by_url(items):
     """同一URLの重複除去"""
@@ -153,30 +537,36 @@ def dedupe_by_url(items):
         out.append(it)
     return out
 
-def sort_newest(items):
-    """重要度が高い→新しい（published_tsが大きい）順"""
-    return sorted(
-        items,
-        key=lambda x: (-(int(x.get("importance", 3))), -(int(x.get("published_ts", 0)))),
-        reverse=False,
-    )
+def _importance_newest_key(it):
+    # importance / published_ts は収集時に int 化済み
+    return (-it["importance"], -it["published_ts"])
+
+def sort_newest(items, limit=None):
+    """重要度が高い→新しい（published_tsが大きい）順。limit 指定時は上位 limit 件だけ返す"""
+    if limit is not None:
+        # sorted(...)[:limit] と同じ順序（安定）を O(N log limit) で得る
+        return heapq.nsmallest(limit, items, key=_importance_newest_key)
+    return sorted(items, key=_importance_newest_key)
+
+_BRACKET_PREFIX_RE = re.compile(r"^\[[^\]]+\]\s*")
+_WS_RE = re.compile(r"\s+")
 
 def clean_title_for_digest(title: str) -> str:
     t = (title or "").strip()
     # 先頭の [xxx] を落とす
-    t = re.sub(r"^\[[^\]]+\]\s*", "", t)
+    t = _BRACKET_PREFIX_RE.sub("", t)
     # 余計な空白
-    t = re.sub(r"\s+", " ", t)
+    t = _WS_RE.sub(" ", t)
     return t
 
 def clean_summary_for_digest(summary: str) -> str:
     s = (summary or "").strip()
-    s = re.sub(r"\s+", " ", s)
+    s = _WS_RE.sub(" ", s)
     return s
 
 def make_digest_block(label: str, items: list, max_lines: int = 6) -> str:
     # 最新（published_ts）順の上位を使う
-    sorted_items = sorted(items, key=lambda x: int(x.get('published_ts', 0)), reverse=True)
+    sorted_items = sorted(items, key=lambda x: x["published_ts"], reverse=True)
     lines = []
     seen_urls = set()
     for it in sorted_items:
@@ -213,7 +603,7 @@ def make_digest_block(label: str, items: list, max_lines: int = 6) -> str:
             "</div>"
         )
 
-    lis = "".join([f"<li>{safe_text(x)}</li>" for x in lines])
+    lis = "".join([f"<li>{escape_html(x)}</li>" for x in lines])
     return (
         "<div class='card'>"
         f"<div class='meta'><span class='badge imp'>今日の要約（{label}）</span></div>"
@@ -230,53 +620,87 @@ def main():
     cfg_llm = load_yaml(CONFIG_DIR / "llm.yaml")
     cfg_pub = load_yaml(CONFIG_DIR / "public.yaml")
 
+    llm_cfg = cfg_llm.get("llm", {})
+    llm_mode = llm_cfg.get("mode", "manual_preferred")
+
     enabled_packs = [k for k, v in cfg_news.get("topic_packs", {}).items() if v.get("enabled")]
 
     state_path = DATA_DIR / "state.json"
-    state = json.loads(state_path.read_text(encoding="utf-8")) if state_path.exists() else {}
+    state = load_json(state_path) if state_path.exists() else {}
 
     run_at = now_jst()
     run_at_str = run_at.strftime("%Y-%m-%d %H:%M:%S %Z")
 
     all_items = []
     sources_status_lines = []
+    newest_by_pack = {}
+
+    api_key = os.getenv("EDINET_API_KEY", "").strip()
+    date_str = run_at.strftime("%Y-%m-%d")
+
+    # HTTP取得（RSS / EDINET）は先にまとめて並列実行しておく
+    fetch_targets = [
+        src
+        for pack_name in enabled_packs
+        for src in cfg_news["topic_packs"][pack_name].get("sources", [])
+        if src.get("type") == "rss" or (src.get("type") == "edinet" and api_key)
+    ]
+    fetched = fetch_sources(fetch_targets, api_key, date_str)
 
     # 収集
     for pack_name in enabled_packs:
         pack = cfg_news["topic_packs"][pack_name]
         rules = pack.get("rules", {})
 
-        deny_keywords = rules.get("deny_keywords", []) or []
-        allow_keywords = rules.get("allow_keywords", []) or []
+        tag_keywords = rules.get("tag_keywords", {}) or {}
+        # allow / deny / タグ判定を1回の走査で済ませる
+        matcher = compile_keyword_matcher({
+            _ALLOW: rules.get("allow_keywords", []),
+            _DENY: rules.get("deny_keywords", []),
+            **tag_keywords,
+        })
+        # パック内の URL 重複は収集時に落とす（パックを跨ぐ重複はログ用に後段で除去）
+        seen_urls = set()
+        # 設定ページ用に、パック内で最も新しいアイテムを収集しながら覚えておく
+        newest = None
 
         for src in pack.get("sources", []):
-            st = {"name": src.get("name"), "type": src.get("type"), "ok": True, "error": ""}
+            # 状態表示用の値も収集時に正規化しておく（描画時はエスケープのみ）
+            source_name = safe_text(src.get("name"))
+            st = {"name": source_name, "type": safe_text(src.get("type")), "ok": True, "error": ""}
             try:
                 if src["type"] == "rss":
                     base_importance = int(src.get("base_importance", 3))
-                    feed = fetch_rss(src["url"])
+                    feed = fetched[id(src)]
+                    if isinstance(feed, Exception):
+                        raise feed
                     for e in feed.entries[:50]:
-                        published = safe_text(getattr(e, "published", "") or getattr(e, "updated", ""))
                         title = safe_text(getattr(e, "title", ""))
-                        url = safe_text(getattr(e, "link", ""))
-                        summary = safe_text(getattr(e, "summary", ""))
+                        # summary は HTML のことがあるので、タグと script/style を落としたテキストにする
+                        summary = safe_text(html_to_text(getattr(e, "summary", "")))
+
+                        # 除外判定を先に済ませ、落とすエントリでは URL / 日時に触れない
+                        hits = match_keywords(matcher, title + " " + summary)
+                        if _DENY in hits and _ALLOW not in hits:
+                            continue
 
-                        joined = title + " " + summary
-                        allow_hit = any(k in joined for k in allow_keywords)
-                        deny_hit = any(k in joined for k in deny_keywords)
-                        if deny_hit and not allow_hit:
+                        url = safe_text(getattr(e, "link", ""))
+                        # href に埋め込むので http(s) 以外（javascript: 等）は採らない
+                        if not url.lower().startswith(("http://", "https://")) or url in seen_urls:
                             continue
+                        seen_urls.add(url)
 
+                        published = safe_text(getattr(e, "published", "") or getattr(e, "updated", ""))
                         published_ts = entry_timestamp(e)
                         if published_ts == 0:
                             published_ts = parse_timestamp_fallback(published, run_at)
 
-                        tags = tag_from_keywords(title, summary, rules.get("tag_keywords", {}))
+                        tags = [tag for tag in tag_keywords if tag in hits]
 
-                        all_items.append({
+                        item = {
                             "id": f"{pack_name}:{src.get('id')}:{url}",
                             "topic_pack": pack_name,
-                            "source": src.get("name"),
+                            "source": source_name,
                             "title": title,
                             "url": url,
                             "published_at": published,
@@ -285,36 +709,46 @@ def main():
                             "tags": tags,
                             "importance": base_importance,
                             "impact": "unclear",
-                            "llm_mode": cfg_llm.get("llm", {}).get("mode", "manual_preferred"),
+                            "llm_mode": llm_mode,
                             "llm_draft": False,
                             "llm_confidence": "low",
-                        })
+                        }
+                        all_items.append(item)
+                        if newest is None or published_ts > newest["published_ts"]:
+                            newest = item
 
                 elif src["type"] == "edinet":
-                    api_key = os.getenv("EDINET_API_KEY", "").strip()
                     if not api_key:
                         st["ok"] = False
                         st["error"] = "EDINET_API_KEY not set (skipped)"
                     else:
-                        date_str = run_at.strftime("%Y-%m-%d")
-                        js = fetch_edinet_daily(src["endpoint"], api_key, date_str)
+                        js = fetched[id(src)]
+                        if isinstance(js, Exception):
+                            raise js
                         include_codes = set(src.get("include_doc_type_codes", []))
+                        id_prefix = f"{pack_name}:{src.get('id')}:"
                         for r in js.get("results", [])[:400]:
                             doc_type = str(r.get("docTypeCode") or "")
                             if include_codes and doc_type and doc_type not in include_codes:
                                 continue
+                            doc_id = safe_text(r.get("docID"))
+                            if not doc_id:
+                                continue
+                            url = EDINET_DOC_URL.format(doc_id)
+                            if url in seen_urls:
+                                continue
+                            seen_urls.add(url)
+
                             title = safe_text(r.get("docDescription"))
                             filer = safe_text(r.get("filerName"))
                             sec = safe_text(r.get("secCode"))
-                            doc_id = safe_text(r.get("docID"))
                             published = safe_text(r.get("submitDateTime"))
                             published_ts = iso_timestamp(published)
-                            url = f"https://disclosure.edinet-fsa.go.jp/api/v2/documents/{doc_id}?type=2" if doc_id else ""
 
-                            all_items.append({
-                                "id": f"{pack_name}:{src.get('id')}:{doc_id}",
+                            item = {
+                                "id": id_prefix + doc_id,
                                 "topic_pack": pack_name,
-                                "source": src.get("name"),
+                                "source": source_name,
                                 "title": (f"{filer} {title}" if filer else title),
                                 "url": url,
                                 "published_at": published,
@@ -323,34 +757,42 @@ def main():
                                 "tags": ["法定開示"],
                                 "importance": 4,
                                 "impact": "unclear",
-                                "llm_mode": cfg_llm.get("llm", {}).get("mode", "manual_preferred"),
+                                "llm_mode": llm_mode,
                                 "llm_draft": True,
                                 "llm_confidence": "low",
-                            })
+                            }
+                            all_items.append(item)
+                            if newest is None or published_ts > newest["published_ts"]:
+                                newest = item
                 else:
                     st["ok"] = False
-                    st["error"] = f"Unknown source type: {src['type']}"
+                    st["error"] = f"Unknown source type: {st['type']}"
 
             except Exception as e:
                 st["ok"] = False
-                st["error"] = str(e)
+                st["error"] = safe_text(str(e))
 
             sources_status_lines.append(st)
 
+        if newest is not None:
+            newest_by_pack[pack_name] = newest
+
     items_by_pack = {}
     for it in all_items:
         items_by_pack.setdefault(it.get("topic_pack", "unknown"), []).append(it)
 
-    inv_items = sort_newest(dedupe_by_url(items_by_pack.get("investing_jp", [])))
-    gen_items = sort_newest(dedupe_by_url(items_by_pack.get("world_general", [])))
+    inv_items = sort_newest(items_by_pack.get("investing_jp", []))
+    gen_items = sort_newest(items_by_pack.get("world_general", []))
 
     # Index: 要約（投資/一般） + ハイライト
     digest_investing = make_digest_block("投資", inv_items)
     digest_general = make_digest_block("一般", gen_items)
 
-    index_sections = digest_investing + digest_general + build_cards(inv_items[:10] + gen_items[:10])
-    inv_sections = build_cards(inv_items[:30])
-    gen_sections = build_cards(gen_items[:50])
+    # 表示用エスケープはアイテムごとに1回（複数ページに載るアイテムも使い回す）
+    esc_cache = {}
+    index_sections = digest_investing + digest_general + build_cards(inv_items[:10] + gen_items[:10], esc_cache)
+    inv_sections = build_cards(inv_items[:30], esc_cache)
+    gen_sections = build_cards(gen_items[:50], esc_cache)
 
     # B'（資産クラス比率）
     pub = cfg_pub.get("public_site", {})
@@ -380,92 +822,94 @@ def main():
     subtitle = "NewsHub Pages Digest（公開: 一般情報のみ / B'はスイッチ）"
 
     # index
-    index_inner = render("page_index.html", {"enabled_packs": ", ".join(enabled_packs), "sections": index_sections})
-    (OUT_DIR / "index.html").write_text(wrap_base("今日 | NewsHub", subtitle, index_inner, run_at_str), encoding="utf-8")
+    index_html = render_page(
+        "page_index.html", "今日 | NewsHub", subtitle, run_at_str,
+        {"enabled_packs": ", ".join(enabled_packs), "sections": index_sections},
+    )
+    pages = [(OUT_DIR / "index.html", index_html)]
 
     # investing
-    inv_inner = render(
-        "page_investing.html",
+    inv_html = render_page(
+        "page_investing.html", "投資 | NewsHub", subtitle, run_at_str,
         {
-            "llm_mode": cfg_llm.get("llm", {}).get("mode", "manual_preferred"),
-            "manual_stale_days": str(cfg_llm.get("llm", {}).get("manual_stale_days", 3)),
+            "llm_mode": llm_mode,
+            "manual_stale_days": str(llm_cfg.get("manual_stale_days", 3)),
             "asset_mix_block": asset_mix_block,
             "sections": inv_sections,
         },
     )
-    (OUT_DIR / "investing.html").write_text(wrap_base("投資 | NewsHub", subtitle, inv_inner, run_at_str), encoding="utf-8")
+    pages.append((OUT_DIR / "investing.html", inv_html))
 
     # general
-    gen_inner = render("page_general.html", {"sections": gen_sections})
-    (OUT_DIR / "general.html").write_text(wrap_base("一般 | NewsHub", subtitle, gen_inner, run_at_str), encoding="utf-8")
+    gen_html = render_page("page_general.html", "一般 | NewsHub", subtitle, run_at_str, {"sections": gen_sections})
+    pages.append((OUT_DIR / "general.html", gen_html))
 
     # log
-    all_sorted = sort_newest(dedupe_by_url(all_items))
+    all_sorted = sort_newest(dedupe_by_url(all_items), limit=80)
     log_path = DATA_DIR / "news_log.csv"
-    existing_ids = set()
-    if log_path.exists():
-        with log_path.open("r", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
-            for row in reader:
-                existing_ids.add(row.get("id", ""))
-
-    with log_path.open("a", encoding="utf-8", newline="") as f:
-        writer = csv.writer(f)
-        for it in all_sorted[:80]:
-            if it["id"] in existing_ids:
-                continue
-            writer.writerow([
-                it["id"], it["topic_pack"], it["source"], it["title"], it["url"], it["published_at"],
-                it["summary_short"], " ".join(it["tags"]), it["importance"], it["impact"],
-                it["llm_mode"], it["llm_draft"], it["llm_confidence"],
-            ])
+    existing_ids = load_log_ids(log_path)
+
+    lines = []
+    for it in all_sorted:
+        if it["id"] in existing_ids:
+            continue
+        lines.append(csv_line([
+            it["id"], it["topic_pack"], it["source"], it["title"], it["url"], it["published_at"],
+            it["summary_short"], " ".join(it["tags"]), it["importance"], it["impact"],
+            it["llm_mode"], it["llm_draft"], it["llm_confidence"],
+        ]))
+
+    with log_path.open("ab") as f:
+        f.write("".join(lines).encode("utf-8"))
 
     # log page
-    rows_html = ""
-    for it in all_sorted[:80]:
-        rows_html += (
+    rows_parts = []
+    for it in all_sorted:
+        esc = html_fields(it, esc_cache)
+        rows_parts.append(
             "<div class='card'>"
-            f"<div class='meta'><span class='badge'>{it.get('topic_pack')}</span><span class='badge'>{safe_text(it.get('published_at'))}</span></div>"
-            f"<div class='title'><a class='link' href='{it.get('url')}' target='_blank' rel='noopener'>{safe_text(it.get('title'))}</a></div>"
-            f"<div class='summary'>{safe_text(it.get('summary_short'))}</div>"
+            f"<div class='meta'><span class='badge'>{esc['topic_pack']}</span><span class='badge'>{esc['published_at']}</span></div>"
+            f"<div class='title'><a class='link' href='{esc['url']}' target='_blank' rel='noopener'>{esc['title']}</a></div>"
+            f"<div class='summary'>{esc['summary_short']}</div>"
             "</div>"
         )
 
-    log_inner = render("page_log.html", {"rows": rows_html})
-    (OUT_DIR / "log.html").write_text(wrap_base("ログ | NewsHub", subtitle, log_inner, run_at_str), encoding="utf-8")
+    log_html = render_page("page_log.html", "ログ | NewsHub", subtitle, run_at_str, {"rows": "".join(rows_parts)})
+    pages.append((OUT_DIR / "log.html", log_html))
 
     # settings: count + newest info for debugging
-    def newest_info(items):
-        if not items:
+    def newest_info(pack_name):
+        it = newest_by_pack.get(pack_name)
+        if it is None:
             return "-"
-        it = max(items, key=lambda x: int(x.get('published_ts', 0)))
-        return f"{safe_text(it.get('published_at'))} / {safe_text(it.get('title'))[:60]}"
+        return f"{it['published_at']} / {it['title'][:60]}"
 
-    sources_html = ""
+    sources_parts = []
     for s in sources_status_lines:
         status = "OK" if s.get("ok") else "NG"
-        err = safe_text(s.get("error"))
-        sources_html += f"<div class='summary'>[{status}] {safe_text(s.get('name'))} ({safe_text(s.get('type'))}){(' - ' + err) if err else ''}</div>"
+        err = escape_html(s["error"])
+        sources_parts.append(f"<div class='summary'>[{status}] {escape_html(s['name'])} ({escape_html(s['type'])}){(' - ' + err) if err else ''}</div>")
 
-    sources_html += "<div class='summary' style='margin-top:10px'><b>統計</b></div>"
-    sources_html += f"<div class='summary'>investing_jp 件数: {len(inv_items)} / 最新: {safe_text(newest_info(inv_items))}</div>"
-    sources_html += f"<div class='summary'>world_general 件数: {len(gen_items)} / 最新: {safe_text(newest_info(gen_items))}</div>"
+    sources_parts.append("<div class='summary' style='margin-top:10px'><b>統計</b></div>")
+    sources_parts.append(f"<div class='summary'>investing_jp 件数: {len(inv_items)} / 最新: {escape_html(newest_info('investing_jp'))}</div>")
+    sources_parts.append(f"<div class='summary'>world_general 件数: {len(gen_items)} / 最新: {escape_html(newest_info('world_general'))}</div>")
 
-    st_inner = render(
-        "page_settings.html",
+    st_html = render_page(
+        "page_settings.html", "設定 | NewsHub", subtitle, run_at_str,
         {
             "last_run": run_at_str,
             "last_success": run_at_str,
             "show_asset_mix": str(pub.get("show_asset_mix")),
-            "sources_status": sources_html,
+            "sources_status": "".join(sources_parts),
         },
     )
-    (OUT_DIR / "settings.html").write_text(wrap_base("設定 | NewsHub", subtitle, st_inner, run_at_str), encoding="utf-8")
+    pages.append((OUT_DIR / "settings.html", st_html))
+    write_pages(pages)
 
     # update state
     state["last_run"] = run_at_str
     state["last_success"] = run_at_str
-    (DATA_DIR / "state.json").write_text(json.dumps(state, ensure_ascii=False, indent=2), encoding="utf-8")
+    write_if_changed(state_path, dump_json(state))
 
 
 if __name__ == "__main__":